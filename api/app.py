@@ -1,37 +1,54 @@
 # Library imports
 import os
-import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from io import StringIO
+from threading import Lock
 import numpy as np
-import pandas as pd
-import yfinance as yf
-from flask import Flask, render_template, request, jsonify
+import orjson
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from cachetools import LRUCache, cached
+from flask import Flask, Response, render_template, request, jsonify
+from flask_compress import Compress
 
 # Local imports
-from yfinance_data import get_stock_data, get_tickers
-from indicators import (
-    calculate_indicators, calculate_garman_klass_volatility, 
-    calculate_rsi, calculate_bollinger_bands, calculate_atr, 
-    calculate_dollar_volume, calculate_percent_change, 
-    calculate_sma, calculate_pe_ratio
-)
+from yfinance_data import get_stock_data, get_stock_data_many, get_tickers, get_trailing_eps
+from indicators import calculate_indicators, warm_up
 
 # Flask app initialization
 template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'templates'))
 static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static'))
 app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
 
-# Custom JSON encoder to handle NumPy and Pandas data types
-class NpEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, (np.integer, np.floating)):
-            return float(obj)
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        if pd.isna(obj):
-            return None
-        return super(NpEncoder, self).default(obj)
+# Compress API responses with gzip, including the streamed CSV export;
+# level 1 keeps the CPU cost low for a large size reduction.
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/csv']
+app.config['COMPRESS_ALGORITHM'] = 'gzip'
+app.config['COMPRESS_ALGORITHM_STREAMING'] = 'gzip'
+app.config['COMPRESS_LEVEL'] = 1
+Compress(app)
+
+# Compile the indicator kernels at startup so the first request doesn't pay for it
+try:
+    warm_up()
+except Exception as e:
+    print(f"Indicator warm-up failed: {str(e)}")
+
+# Worker threads for the EPS lookup that runs alongside each request's history download
+executor = ThreadPoolExecutor(max_workers=8)
+
+# Indicator results shared by the JSON and CSV routes. The key includes a signature
+# of the price data so a refreshed download for the same range is recomputed.
+def _indicators_key(symbol, start_date, end_date, stock_data, earnings_per_share):
+    return (symbol, start_date, end_date, earnings_per_share,
+            len(stock_data), float(stock_data['Close'].iloc[-1]))
+
+@cached(LRUCache(maxsize=256), key=_indicators_key, lock=Lock())
+def get_indicators(symbol, start_date, end_date, stock_data, earnings_per_share):
+    indicators = calculate_indicators(stock_data, earnings_per_share)
+    for values in indicators.values():
+        values.flags.writeable = False  # cached, so callers must not modify them
+    return indicators
 
 @app.route('/')
 def index():
@@ -57,36 +74,68 @@ def api_get_stock_data():
         
         print(f"Fetching data for {symbol} from {start_date} to {end_date}")
         
-        # Fetch stock data
+        # Fetch additional stock info in the background while fetching stock data
+        eps_future = executor.submit(get_trailing_eps, symbol)
         stock_data = get_stock_data(symbol, start_date, end_date)
         
         if stock_data.empty:
             return jsonify({'error': 'No data available for the specified date range'}), 404
         
-        # Fetch additional stock info
-        stock = yf.Ticker(symbol)
-        earnings_per_share = stock.info.get('trailingEps', 0)
+        earnings_per_share = eps_future.result()
         
         # Calculate indicators
-        indicators = calculate_indicators(stock_data, earnings_per_share)
+        indicators = get_indicators(symbol, start_date, end_date, stock_data, earnings_per_share)
         
         # Prepare response data
         stock_data.index = stock_data.index.strftime('%Y-%m-%d')
         stock_data_dict = stock_data.reset_index().to_dict(orient='records')
         
-        # Ensure all indicator values are serializable
-        indicators_dict = {
-            key: value.tolist() if isinstance(value, (pd.Series, np.ndarray)) else value
-            for key, value in indicators.items()
-        }
-        
+        # float32 is plenty for charting and shortens the encoded indicators (about a quarter
+        # off the response). Dollar volume (~1e10) stays float64, like Volume, since float32
+        # would round it to steps of hundreds of dollars.
         response_data = {
             'stock_data': stock_data_dict,
-            'indicators': indicators_dict
+            'indicators': {
+                key: values if key == 'dollar_volume' else values.astype(np.float32)
+                for key, values in indicators.items()
+            }
         }
         
         print("Data prepared successfully")
-        return json.dumps(response_data, cls=NpEncoder), 200, {'Content-Type': 'application/json'}
+        return orjson.dumps(response_data, option=orjson.OPT_SERIALIZE_NUMPY), 200, {'Content-Type': 'application/json'}
+    
+    except Exception as e:
+        print(f"Error occurred: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/get_stock_data_bulk')
+def api_get_stock_data_bulk():
+    """
+    API endpoint to fetch price data for several stocks in batched requests.
+    
+    Query parameters:
+    - symbols: Comma-separated stock symbols (default: AAPL)
+    - start: Start date (default: 2024-01-01)
+    - end: End date (default: current date)
+    """
+    try:
+        # Extract query parameters
+        symbols = [s.strip().upper() for s in request.args.get('symbols', 'AAPL').split(',') if s.strip()]
+        start_date = request.args.get('start', '2024-01-01')
+        end_date = request.args.get('end', datetime.now().strftime('%Y-%m-%d'))
+        
+        print(f"Fetching data for {len(symbols)} symbols from {start_date} to {end_date}")
+        
+        # Fetch stock data
+        stock_data = get_stock_data_many(symbols, start_date, end_date)
+        
+        # Prepare response data
+        response_data = {}
+        for symbol, data in stock_data.items():
+            data.index = data.index.strftime('%Y-%m-%d')
+            response_data[symbol] = data.reset_index().to_dict(orient='records')
+        
+        return orjson.dumps(response_data, option=orjson.OPT_SERIALIZE_NUMPY), 200, {'Content-Type': 'application/json'}
     
     except Exception as e:
         print(f"Error occurred: {str(e)}")
@@ -95,7 +144,7 @@ def api_get_stock_data():
 @app.route('/api/export_csv')
 def export_csv():
     """
-    API endpoint to export stock data and indicators as CSV.
+    API endpoint to export stock data and indicators as a CSV file download.
     
     Query parameters:
     - symbol: Stock symbol (default: AAPL)
@@ -108,41 +157,43 @@ def export_csv():
         start_date = request.args.get('start', '2020-01-01')
         end_date = request.args.get('end', datetime.now().strftime('%Y-%m-%d'))
         
-        # Fetch stock data
+        # Fetch additional stock info in the background while fetching stock data
+        eps_future = executor.submit(get_trailing_eps, symbol)
         stock_data = get_stock_data(symbol, start_date, end_date)
         
         if stock_data.empty:
             return jsonify({'error': 'No data available for the specified date range'}), 404
         
-        # Fetch additional stock info
-        stock = yf.Ticker(symbol)
-        earnings_per_share = stock.info.get('trailingEps', 0)
+        earnings_per_share = eps_future.result()
         
         # Calculate indicators
-        combined_data = stock_data.copy()
-        combined_data['garman_klass'] = calculate_garman_klass_volatility(combined_data)
-        combined_data['rsi'] = calculate_rsi(combined_data)
-        upper, middle, lower = calculate_bollinger_bands(combined_data)
-        combined_data['bollinger_upper'] = upper
-        combined_data['bollinger_middle'] = middle
-        combined_data['bollinger_lower'] = lower
-        combined_data['atr'] = calculate_atr(combined_data)
-        combined_data['dollar_volume'] = calculate_dollar_volume(combined_data)
-        combined_data['percent_change'] = calculate_percent_change(combined_data)
-        combined_data['sma_20'] = calculate_sma(combined_data, window=20)
-        combined_data['sma_50'] = calculate_sma(combined_data, window=50)
-        combined_data['pe_ratio'] = calculate_pe_ratio(combined_data, earnings_per_share)
-        
-        # Convert the DataFrame to CSV string
-        csv_buffer = StringIO()
-        combined_data.to_csv(csv_buffer, index=True)
-        csv_string = csv_buffer.getvalue()
-        
-        return jsonify({'csv_data': csv_string, 'filename': f'{symbol}_data.csv'})
+        indicators = get_indicators(symbol, start_date, end_date, stock_data, earnings_per_share)
+        combined_data = stock_data.assign(**indicators)
+        
+        combined_data.index = combined_data.index.strftime('%Y-%m-%d')
+        table = pa.Table.from_pandas(combined_data.reset_index(), preserve_index=False)
+        
+        # Stream the CSV in row chunks with Arrow's writer, so the download starts
+        # before the whole file is serialized
+        def generate():
+            include_header = True
+            for batch in table.to_batches(max_chunksize=500):
+                csv_buffer = pa.BufferOutputStream()
+                pacsv.write_csv(batch, csv_buffer, pacsv.WriteOptions(include_header=include_header))
+                include_header = False
+                yield csv_buffer.getvalue().to_pybytes()
+        
+        return Response(
+            generate(),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename={symbol}_data.csv'}
+        )
     
     except Exception as e:
         print(f"Error occurred: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-if __name__ == '__main__':
-    app.run()
+# Serve with a gunicorn worker pool instead of Flask's development server:
+#   NUMBA_NUM_THREADS=2 gunicorn --chdir api -w 4 -k gthread --threads 8 -b 0.0.0.0:8000 wsgi:app
+# Each worker starts its own Numba thread pool, so keep workers x NUMBA_NUM_THREADS
+# around the number of CPU cores.
@@ -1,164 +1,222 @@
+# Library imports
+import threading
+import numba
+import numpy as np
+from numba import njit, prange
 
-def calculate_garman_klass_volatility(data):
-    """
-    Calculate Garman-Klass volatility.
-    
-    This estimator uses high, low, open, and close prices to estimate volatility,
-    potentially providing a more accurate measure than close-to-close volatility.
-    
-    Args:
-    data (pd.DataFrame): DataFrame containing 'High', 'Low', 'Open', and 'Close' columns.
-    
-    Returns:
-    np.array: Garman-Klass volatility estimates.
-    """
-    log_hl = np.log(data['High'] / data['Low'])
-    log_co = np.log(data['Close'] / data['Open'])
-    return np.sqrt(0.5 * log_hl**2 - (2*np.log(2)-1) * log_co**2)
+# The parallel kernel is called from several request threads at once; only the
+# TBB and OpenMP layers support that (the workqueue fallback aborts the process)
+numba.config.THREADING_LAYER = 'threadsafe'
 
-def calculate_rsi(data, window=20):
+def to_price_arrays(data):
     """
-    Calculate the Relative Strength Index (RSI).
+    Extract the price and volume columns as contiguous float64 arrays.
     
-    RSI is a momentum indicator that measures the magnitude of recent price changes
-    to evaluate overbought or oversold conditions.
+    Do this once per request and hand the arrays to the indicator kernel,
+    instead of pulling each column out of the DataFrame where it is used.
     
     Args:
-    data (pd.DataFrame): DataFrame containing 'Close' column.
-    window (int): The number of periods to use for RSI calculation. Default is 20.
+    data (pd.DataFrame): DataFrame containing 'Open', 'High', 'Low', 'Close', and 'Volume' columns.
     
     Returns:
-    pd.Series: RSI values.
+    tuple: Open, High, Low, Close, and Volume as np.ndarray.
     """
-    delta = data['Close'].diff()
-    gain = delta.where(delta > 0, 0).rolling(window=window).mean()
-    loss = -delta.where(delta < 0, 0).rolling(window=window).mean()
-    rs = gain / loss
-    return 100 - (100 / (1 + rs))
+    return tuple(np.ascontiguousarray(data[col].to_numpy(dtype=np.float64))
+                 for col in ['Open', 'High', 'Low', 'Close', 'Volume'])
 
-def calculate_bollinger_bands(data, window=20, num_std=2):
+def calculate_pe_ratio(close, earnings_per_share):
     """
-    Calculate Bollinger Bands.
+    Calculate Price-to-Earnings (P/E) Ratio.
     
-    Bollinger Bands consist of a middle band (typically a simple moving average)
-    and an upper and lower band that are 'num_std' standard deviations away from the middle band.
+    P/E Ratio is the ratio of a company's share price to its earnings per share.
     
     Args:
-    data (pd.DataFrame): DataFrame containing 'Close' column.
-    window (int): The rolling window for calculating the moving average and standard deviation. Default is 20.
-    num_std (int): The number of standard deviations for the upper and lower bands. Default is 2.
+    close (np.ndarray): Close prices.
+    earnings_per_share (float): The company's earnings per share.
     
     Returns:
-    tuple: Upper band, middle band, and lower band as pd.Series.
+    np.ndarray: P/E Ratio values.
     """
-    rolling_mean = data['Close'].rolling(window=window).mean()
-    rolling_std = data['Close'].rolling(window=window).std()
-    upper_band = rolling_mean + (rolling_std * num_std)
-    lower_band = rolling_mean - (rolling_std * num_std)
-    return upper_band, rolling_mean, lower_band
+    return close / earnings_per_share
 
-def calculate_atr(data, window=20):
-    """
-    Calculate Average True Range (ATR).
-    
-    ATR is a technical analysis indicator that measures market volatility.
-    
-    Args:
-    data (pd.DataFrame): DataFrame containing 'High', 'Low', and 'Close' columns.
-    window (int): The number of periods to use for ATR calculation. Default is 20.
-    
-    Returns:
-    pd.Series: ATR values.
-    """
-    high_low = data['High'] - data['Low']
-    high_close = np.abs(data['High'] - data['Close'].shift())
-    low_close = np.abs(data['Low'] - data['Close'].shift())
-    ranges = pd.concat([high_low, high_close, low_close], axis=1)
-    true_range = np.max(ranges, axis=1)
-    return true_range.rolling(window=window).mean()
-
-def calculate_dollar_volume(data):
-    """
-    Calculate Dollar Volume.
-    
-    Dollar Volume is the product of closing price and trading volume.
-    
-    Args:
-    data (pd.DataFrame): DataFrame containing 'Close' and 'Volume' columns.
-    
-    Returns:
-    pd.Series: Dollar Volume values.
-    """
-    return data['Close'] * data['Volume']
+@njit(cache=True)
+def _roll(x_new, x_old, total, nobs):
+    """Slide a running window sum one step, skipping NaN values like pandas does."""
+    if x_new == x_new:
+        total += x_new
+        nobs += 1
+    if x_old == x_old:
+        total -= x_old
+        nobs -= 1
+    return total, nobs
 
-def calculate_percent_change(data):
-    """
-    Calculate Percent Change.
-    
-    Percent Change measures the day-over-day percentage change in closing price.
-    
-    Args:
-    data (pd.DataFrame): DataFrame containing 'Close' column.
-    
-    Returns:
-    pd.Series: Percent Change values.
-    """
-    return ((data['Close'] - data['Close'].shift(1)) / data['Close'].shift(1)) * 100
+@njit(cache=True)
+def _rolling_mean(x, window, out):
+    """Write the rolling mean of `x` into `out` using a running window sum."""
+    total = 0.0
+    nobs = 0
+    for i in range(x.shape[0]):
+        old = x[i - window] if i >= window else np.nan
+        total, nobs = _roll(x[i], old, total, nobs)
+        out[i] = total / window if nobs == window else np.nan
 
-def calculate_sma(data, window=20):
-    """
-    Calculate Simple Moving Average (SMA).
-    
-    SMA is the unweighted mean of the previous 'window' data points.
-    
-    Args:
-    data (pd.DataFrame): DataFrame containing 'Close' column.
-    window (int): The number of periods to use for SMA calculation. Default is 20.
-    
-    Returns:
-    pd.Series: SMA values.
-    """
-    return data['Close'].rolling(window=window).mean()
+@njit(cache=True)
+def _rolling_std(x, window, out):
+    """Write the rolling sample standard deviation of `x` into `out`."""
+    total = sq_total = 0.0
+    nobs = sq_nobs = 0
+    for i in range(x.shape[0]):
+        old = x[i - window] if i >= window else np.nan
+        total, nobs = _roll(x[i], old, total, nobs)
+        sq_total, sq_nobs = _roll(x[i] * x[i], old * old, sq_total, sq_nobs)
+        if nobs == window:
+            out[i] = np.sqrt(max((sq_total - total * total / window) / (window - 1), 0.0))
+        else:
+            out[i] = np.nan
+
+@njit(cache=True, error_model='numpy')
+def _rsi_wilder(close, window, out):
+    """
+    Write the RSI of `close` into `out` using Wilder's smoothing.
+    
+    The averages are seeded with the simple mean of the first `window` gains/losses
+    and then updated as avg = (avg * (window - 1) + value) / window, so the first
+    `window` bars are NaN. A missing close counts as no change.
+    """
+    avg_gain = avg_loss = 0.0
+    for i in range(close.shape[0]):
+        delta = close[i] - close[i - 1] if i > 0 else np.nan
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        if i == 0:
+            out[i] = np.nan
+            continue
+        if i <= window:
+            avg_gain += gain / window
+            avg_loss += loss / window
+        else:
+            avg_gain = (avg_gain * (window - 1) + gain) / window
+            avg_loss = (avg_loss * (window - 1) + loss) / window
+        out[i] = 100 - 100 / (1 + avg_gain / avg_loss) if i >= window else np.nan
 
-def calculate_pe_ratio(data, earnings_per_share):
+@njit(cache=True, parallel=True, error_model='numpy')
+def _fused(o, h, l, c, v, true_range, bb_std, win_bb, win_rsi, win_atr, win_s20, win_s50, num_std=2.0):
     """
-    Calculate Price-to-Earnings (P/E) Ratio.
+    Compute the rolling indicators from the price arrays in parallel.
     
-    P/E Ratio is the ratio of a company's share price to its earnings per share.
+    The element-wise indicators are computed bar by bar across threads. The rolling
+    means/stds and Wilder's RSI are independent of each other, so each one runs as
+    its own parallel task over a running window sum, costing O(N) regardless of
+    the window size. Windows containing NaN produce NaN, matching pandas'
+    rolling().mean()/std().
+    The thread count follows NUMBA_NUM_THREADS (all cores by default).
     
     Args:
-    data (pd.DataFrame): DataFrame containing 'Close' column.
-    earnings_per_share (float): The company's earnings per share.
+    o, h, l, c, v (np.ndarray): Open, High, Low, Close and Volume as float64 arrays.
+    true_range, bb_std (np.ndarray): Work buffers of the same length, overwritten.
+    win_bb, win_rsi, win_atr, win_s20, win_s50 (int): Window of each rolling indicator.
+    num_std (float): The number of standard deviations for the Bollinger bands.
     
     Returns:
-    pd.Series: P/E Ratio values.
-    """
-    return data['Close'] / earnings_per_share
+    tuple: Garman-Klass, RSI, Bollinger upper/middle/lower, ATR, dollar volume,
+    percent change, and the two SMAs as np.ndarray.
+    """
+    n = c.shape[0]
+    gk = np.empty(n)
+    rsi = np.empty(n)
+    bb_upper = np.empty(n)
+    bb_middle = np.empty(n)
+    bb_lower = np.empty(n)
+    atr = np.empty(n)
+    dollar_volume = np.empty(n)
+    percent_change = np.empty(n)
+    sma_20 = np.empty(n)
+    sma_50 = np.empty(n)
+
+    gk_coef = 2 * np.log(2) - 1
+    for i in prange(n):
+        prev_close = c[i - 1] if i > 0 else np.nan
+        log_hl = np.log(h[i] / l[i])
+        log_co = np.log(c[i] / o[i])
+        gk[i] = np.sqrt(0.5 * log_hl**2 - gk_coef * log_co**2)
+        dollar_volume[i] = c[i] * v[i]
+        percent_change[i] = (c[i] - prev_close) / prev_close * 100
+
+        # True range is the largest of the three ranges, ignoring missing ones
+        tr = h[i] - l[i]
+        for r in (abs(h[i] - prev_close), abs(l[i] - prev_close)):
+            if r > tr or tr != tr:
+                tr = r
+        true_range[i] = tr
+
+    # Each rolling reduction is sequential in time but independent of the others
+    for task in prange(6):
+        if task == 0:
+            _rolling_mean(c, win_s20, sma_20)
+        elif task == 1:
+            _rolling_mean(c, win_s50, sma_50)
+        elif task == 2:
+            _rolling_mean(c, win_bb, bb_middle)
+        elif task == 3:
+            _rolling_std(c, win_bb, bb_std)
+        elif task == 4:
+            _rolling_mean(true_range, win_atr, atr)
+        else:
+            _rsi_wilder(c, win_rsi, rsi)
+
+    for i in prange(n):
+        bb_upper[i] = bb_middle[i] + bb_std[i] * num_std
+        bb_lower[i] = bb_middle[i] - bb_std[i] * num_std
+
+    return (gk, rsi, bb_upper, bb_middle, bb_lower, atr,
+            dollar_volume, percent_change, sma_20, sma_50)
+
+# Per-thread work buffers for the kernel's intermediate series, reused across requests.
+# Only intermediates are pooled: the returned indicator arrays end up in the response
+# cache, so they always get fresh memory.
+_work_buffers = threading.local()
+
+def _get_work_buffers(n):
+    """Return this thread's (true_range, bb_std) work buffers sized to `n`, growing them if needed."""
+    buffers = getattr(_work_buffers, 'buffers', None)
+    if buffers is None or buffers.shape[1] < n:
+        buffers = _work_buffers.buffers = np.empty((2, n))
+    return buffers[0, :n], buffers[1, :n]
+
+def warm_up():
+    """Compile the Numba kernels (or load them from the on-disk cache) ahead of the first request."""
+    prices = np.ones(64)
+    _fused(prices, prices, prices, prices, prices, *_get_work_buffers(64), 20, 20, 20, 20, 50)
 
 def calculate_indicators(data, earnings_per_share):
     """
     Calculate all technical indicators.
     
     This function calculates various technical indicators and returns them as a dictionary.
+    The rolling indicators are computed together by the parallel Numba kernel.
     
     Args:
     data (pd.DataFrame): DataFrame containing price and volume data.
     earnings_per_share (float): The company's earnings per share.
     
     Returns:
-    dict: A dictionary containing all calculated indicators.
+    dict: A dictionary mapping each indicator name to a float64 np.ndarray. Bars without
+    a value (e.g. during a rolling window's warm-up) are NaN.
     """
+    o, h, l, c, v = to_price_arrays(data)
+    true_range, bb_std = _get_work_buffers(len(c))
+    (garman_klass, rsi, upper, middle, lower, atr,
+     dollar_volume, percent_change, sma_20, sma_50) = _fused(o, h, l, c, v, true_range, bb_std, 20, 20, 20, 20, 50)
     indicators = {}
-    indicators['garman_klass'] = calculate_garman_klass_volatility(data).fillna(0).tolist()
-    indicators['rsi'] = calculate_rsi(data).fillna(0).tolist()
-    upper, middle, lower = calculate_bollinger_bands(data)
-    indicators['bollinger_upper'] = upper.fillna(0).tolist()
-    indicators['bollinger_middle'] = middle.fillna(0).tolist()
-    indicators['bollinger_lower'] = lower.fillna(0).tolist()
-    indicators['atr'] = calculate_atr(data).fillna(0).tolist()
-    indicators['dollar_volume'] = calculate_dollar_volume(data).fillna(0).tolist()
-    indicators['percent_change'] = calculate_percent_change(data).fillna(0).tolist()
-    indicators['sma_20'] = calculate_sma(data, window=20).fillna(0).tolist()
-    indicators['sma_50'] = calculate_sma(data, window=50).fillna(0).tolist()
-    indicators['pe_ratio'] = calculate_pe_ratio(data, earnings_per_share).fillna(0).tolist()
+    indicators['garman_klass'] = garman_klass
+    indicators['rsi'] = rsi
+    indicators['bollinger_upper'] = upper
+    indicators['bollinger_middle'] = middle
+    indicators['bollinger_lower'] = lower
+    indicators['atr'] = atr
+    indicators['dollar_volume'] = dollar_volume
+    indicators['percent_change'] = percent_change
+    indicators['sma_20'] = sma_20
+    indicators['sma_50'] = sma_50
+    indicators['pe_ratio'] = calculate_pe_ratio(c, earnings_per_share)
     return indicators
@@ -0,0 +1,5 @@
+# WSGI entry point for gunicorn; run from the repository root with:
+#   NUMBA_NUM_THREADS=2 gunicorn --chdir api -w 4 -k gthread --threads 8 -b 0.0.0.0:8000 wsgi:app
+# Each worker starts its own Numba thread pool, so keep workers x NUMBA_NUM_THREADS
+# around the number of CPU cores.
+from app import app
@@ -1,20 +1,158 @@
+# Library imports
+import os
+import re
+import tempfile
+import time
+import pandas as pd
+import yfinance as yf
+from cachetools.func import ttl_cache
+from filelock import FileLock
 
-# Get S&P 500 tickers
+# Directory for the on-disk Parquet cache of daily bars (override with STOCK_CACHE_DIR)
+cache_dir = os.environ.get(
+    'STOCK_CACHE_DIR', os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'cache'))
+)
+# Cache files first downloaded longer ago than this are rebuilt, as a backstop for
+# price re-adjustments
+cache_max_age = 7 * 24 * 60 * 60
+# Only plain ticker symbols are used as cache file names
+cacheable_symbol = re.compile(r'^[A-Za-z0-9.\-^=]+$')
+
+# Get S&P 500 tickers (cached for a day, the index membership rarely changes)
+@ttl_cache(maxsize=1, ttl=24 * 60 * 60)
 def get_tickers():
     sp500 = pd.read_html('https://en.wikipedia.org/wiki/List_of_S%26P_500_companies')[0]
     sp500.sort_values(by='Symbol', ascending=True, inplace=True)
     return sp500['Symbol'].tolist()
 
-# Get stock data from Yahoo Finance
-def get_stock_data(symbol, start_date, end_date):
+# Download stock data from Yahoo Finance, including the 'Dividends' and 'Stock Splits' columns
+def _download_history(symbol, start_date, end_date):
     stock = yf.Ticker(symbol)
-    data = stock.history(start=start_date, end=end_date)
+    return stock.history(start=start_date, end=end_date, actions=True)
+
+def _download_stock_data(symbol, start_date, end_date):
+    data = _download_history(symbol, start_date, end_date)
     return data[['Open', 'High', 'Low', 'Close', 'Volume']]
 
+# Read a symbol's Parquet cache file. Files that can't be read or don't record the
+# range they cover (e.g. truncated by a killed worker) are deleted and treated as missing,
+# and files fully downloaded more than cache_max_age ago are treated as missing so they
+# get rebuilt (tail appends keep the original 'fetched' time).
+def _read_cache(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        cached = pd.read_parquet(path)
+    except (OSError, ValueError) as e:
+        print(f"Discarding unreadable cache file {path}: {str(e)}")
+        cached = None
+    if cached is None or any(key not in cached.attrs for key in ('start', 'end', 'fetched')):
+        os.remove(path)
+        return None
+    if time.time() - cached.attrs['fetched'] > cache_max_age:
+        return None
+    return cached
+
+# Write a symbol's Parquet cache file atomically, so readers never see a partial file.
+# Bars from attrs['end'] on (today's unfinished bar) are left out so they get refetched.
+def _write_cache(data, path):
+    stored = data[data.index < data.attrs['end']]
+    stored.attrs = dict(data.attrs)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    os.close(fd)
+    try:
+        stored.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# Get stock data through the Parquet cache, downloading only the bars it is missing.
+# The date range the file covers is kept in its attrs; the end is exclusive like
+# yfinance's and never goes past today, since today's bar can still change. Requests
+# reaching past the covered end always fetch the tail, so today's bar is never stale.
+def _load_stock_data(symbol, start_date, end_date):
+    start_date = pd.Timestamp(start_date).strftime('%Y-%m-%d')
+    end_date = pd.Timestamp(end_date).strftime('%Y-%m-%d')
+    # Today on the exchange's calendar, not the server's
+    today = pd.Timestamp.now(tz='America/New_York').strftime('%Y-%m-%d')
+    covered_end = min(end_date, today)
+    path = os.path.join(cache_dir, f'{symbol}.parquet')
+    os.makedirs(cache_dir, exist_ok=True)
+    with FileLock(f'{path}.lock'):
+        cached = _read_cache(path)
+        fetch_start, fetch_end = start_date, end_date
+        if cached is not None and cached.attrs['start'] <= start_date:
+            if cached.attrs['end'] >= end_date:
+                return _select_dates(cached, start_date, end_date)
+            # Fetch the missing tail, with its dividends and splits
+            new_data = _download_history(symbol, cached.attrs['end'], end_date)
+            actions = new_data.reindex(columns=['Dividends', 'Stock Splits'], fill_value=0)
+            if not actions.any(axis=None):
+                if new_data.empty:
+                    return _select_dates(cached, start_date, end_date)
+                # Replace any bars from the tail's first day on
+                data = pd.concat([cached[cached.index < cached.attrs['end']],
+                                  new_data[['Open', 'High', 'Low', 'Close', 'Volume']]])
+                data.attrs = {'start': cached.attrs['start'], 'end': covered_end,
+                              'fetched': cached.attrs['fetched']}
+                _write_cache(data, path)
+                return _select_dates(data, start_date, end_date)
+            # A dividend or split makes Yahoo re-adjust every earlier price, so the
+            # cached bars are stale; refetch the whole covered range
+            fetch_start = cached.attrs['start']
+        elif cached is not None:
+            # Download the requested range, extended to keep what was cached
+            fetch_end = max(end_date, cached.attrs['end'])
+        data = _download_stock_data(symbol, fetch_start, fetch_end)
+        if not data.empty:
+            data.attrs = {'start': fetch_start, 'end': min(fetch_end, today),
+                          'fetched': time.time()}
+            _write_cache(data, path)
+    return _select_dates(data, start_date, end_date)
+
+# Select the bars in [start_date, end_date) like a yfinance history request would
+def _select_dates(data, start_date, end_date):
+    if data.empty:
+        return data
+    return data[(data.index >= start_date) & (data.index < end_date)]
+
+# Get stock data (cached for a few minutes per symbol and date range, backed by the Parquet cache)
+@ttl_cache(maxsize=512, ttl=5 * 60)
+def _fetch_stock_data(symbol, start_date, end_date):
+    if not cacheable_symbol.match(symbol):
+        return _download_stock_data(symbol, start_date, end_date)
+    try:
+        return _load_stock_data(symbol, start_date, end_date)
+    except OSError as e:
+        print(f"Stock data cache unavailable: {str(e)}")
+        return _download_stock_data(symbol, start_date, end_date)
+
+def get_stock_data(symbol, start_date, end_date):
+    # Hand out a copy so callers can't mutate the cached frame
+    return _fetch_stock_data(symbol, start_date, end_date).copy()
+
+# Get stock data for several symbols, batching them into multi-symbol downloads
+def get_stock_data_many(symbols, start_date, end_date, chunk_size=20):
+    result = {}
+    for i in range(0, len(symbols), chunk_size):
+        chunk = symbols[i:i + chunk_size]
+        data = yf.download(' '.join(chunk), start=start_date, end=end_date, group_by='ticker',
+                           auto_adjust=True, threads=True, progress=False)
+        for symbol in chunk:
+            frame = data[symbol] if isinstance(data.columns, pd.MultiIndex) else data
+            result[symbol] = frame[['Open', 'High', 'Low', 'Close', 'Volume']].dropna(how='all')
+    return result
+
 # Get ticker info from Yahoo Finance
 def get_ticker_info(symbol):
     stock = yf.Ticker(symbol)
     return stock.info
 
+# Get trailing earnings per share (cached, it only changes with earnings reports)
+@ttl_cache(maxsize=512, ttl=15 * 60)
+def get_trailing_eps(symbol):
+    return get_ticker_info(symbol).get('trailingEps', 0)
+
 
 
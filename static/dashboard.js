@@ -310,21 +310,20 @@ document.addEventListener('DOMContentLoaded', function() {
         const url = `/api/export_csv?symbol=${symbol}&start=${startDate}&end=${endDate}`;
 
         fetch(url)
-            .then(response => response.json())
-            .then(data => {
-                if (data.error) {
-                    console.error('Error exporting CSV:', data.error);
-                    alert('Error exporting CSV. Please try again.');
-                    return;
+            .then(response => {
+                // Errors come back as JSON, the CSV itself is the raw response body
+                if (!response.ok) {
+                    return response.json().then(data => { throw new Error(data.error); });
                 }
-
-                // Create and trigger download of CSV file
-                const blob = new Blob([data.csv_data], { type: 'text/csv;charset=utf-8;' });
+                return response.blob();
+            })
+            .then(blob => {
+                // Trigger download of the CSV file
                 const link = document.createElement('a');
                 if (link.download !== undefined) {
                     const url = URL.createObjectURL(blob);
                     link.setAttribute('href', url);
-                    link.setAttribute('download', data.filename);
+                    link.setAttribute('download', `${symbol}_data.csv`);
                     link.style.visibility = 'hidden';
                     document.body.appendChild(link);
                     link.click();